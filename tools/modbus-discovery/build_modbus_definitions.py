@@ -1,12 +1,14 @@
 """Generate modbus-metric-definitions.json from Sungrow CSV exports."""
 from __future__ import annotations
 
+import copy
 import csv
 import json
 import re
 from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, Iterable, List, Optional
+from typing import Dict, List, Optional, Tuple
 
 ROOT = Path(__file__).resolve().parent.parent
 PROJECT_ROOT = ROOT.parent
@@ -94,17 +96,45 @@ FALLBACK_METRICS = {
 }
 
 
+def _fallback_template(metric_id: str) -> dict:
+    is_power = "power" in metric_id
+    is_meter = metric_id == "meter_power"
+    return {
+        "id": metric_id,
+        "name": metric_id.replace("_", " ").title(),
+        "unit": "W" if is_power else "kWh",
+        "category": "power" if is_power else "energy",
+        "default": {},
+        "models": {},
+        "read": {
+            "function": "input",
+            "words": 1 if is_meter else 2,
+            "type": "int16" if is_meter else "uint32le",
+            "scale": 1 if is_meter else 0.1,
+        },
+    }
+
+
+_FALLBACK_TEMPLATES = {metric_id: _fallback_template(metric_id) for metric_id in FALLBACK_METRICS}
+
+_NON_ID = re.compile(r"[^a-z0-9_]")
+_MULTI_UNDERSCORE = re.compile(r"_+")
+_UNIT_TAIL = re.compile(r"([a-zA-ZΩ%℃]+)$")
+_FLOAT_RE = re.compile(r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+
+
+@lru_cache(maxsize=4096)
 def sanitise_metric_id(name: str) -> str:
     metric_id = name.strip().lower().replace(" ", "_").replace("-", "_")
-    metric_id = re.sub(r"[^a-z0-9_]", "", metric_id)
-    metric_id = re.sub(r"_+", "_", metric_id).strip("_")
+    metric_id = _NON_ID.sub("", metric_id)
+    metric_id = _MULTI_UNDERSCORE.sub("_", metric_id).strip("_")
     return metric_id
 
 
 def base_unit(unit: str) -> str:
     if not unit:
         return ""
-    match = re.search(r"([a-zA-ZΩ%℃]+)$", unit)
+    match = _UNIT_TAIL.search(unit)
     return match.group(1) if match else unit
 
 
@@ -113,91 +143,119 @@ def classify_unit(unit: str) -> Optional[str]:
     return UNIT_CATEGORY.get(key)
 
 
-def load_rows(path: Path) -> Iterable[dict]:
-    with path.open(newline="") as handle:
-        reader = csv.DictReader(handle)
-        yield from reader
+def parse_int(value: str) -> Optional[int]:
+    value = value.strip()
+    if value.isdecimal():
+        return int(value)
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+
+def parse_float(value: str) -> float:
+    value = value.strip()
+    if _FLOAT_RE.fullmatch(value):
+        return float(value)
+    if not value:
+        return 1.0
+    try:
+        return float(value)
+    except ValueError:
+        return 1.0
+
+
+def cell(row: List[str], index: Optional[int]) -> str:
+    return row[index] if index is not None else ""
+
+
+@lru_cache(maxsize=4096)
+def unit_info(unit: str) -> Tuple[str, Optional[str]]:
+    engineering_unit = base_unit(unit)
+    category = classify_unit(engineering_unit) if engineering_unit else None
+    return engineering_unit, category
 
 
 def build_definitions() -> dict:
     metrics: Dict[str, dict] = {}
+    sanitise = sanitise_metric_id
+    describe_unit = unit_info
+    metrics_get = metrics.get
 
     for definition in CSV_DEFINITIONS:
         path = definition["path"]
         if not path.exists():
             raise FileNotFoundError(path)
         model = definition["model"]
-        for row in load_rows(path):
-            data_type = row["data_type"].strip().upper()
-            if data_type not in NUMERIC_TYPES:
-                continue
-            address_start = row.get("address_start")
-            try:
-                register = int(address_start) if address_start else None
-            except ValueError:
-                register = None
-            if register is None:
-                continue
-            metric_id = sanitise_metric_id(row["name"])
-            if not metric_id:
+        with path.open(newline="") as handle:
+            reader = csv.reader(handle)
+            header = next(reader, [])
+            if not header:
                 continue
-            type_name, default_words = NUMERIC_TYPES[data_type]
-            words = default_words
-            address_end = row.get("address_end")
-            if address_end:
-                try:
-                    words = max(words, int(address_end) - register + 1)
-                except ValueError:
-                    pass
-            scale_factor = 1.0
-            scale_raw = row.get("scale_factor")
-            if scale_raw:
-                try:
-                    scale_factor = float(scale_raw)
-                except ValueError:
-                    pass
-            unit_raw = row.get("unit", "").strip()
-            engineering_unit = base_unit(unit_raw)
-            category = classify_unit(engineering_unit) if engineering_unit else None
-            metric = metrics.setdefault(
-                metric_id,
-                {
+            columns = {name: index for index, name in enumerate(header)}
+            i_name = columns["name"]
+            i_data_type = columns["data_type"]
+            i_register_type = columns["register_type"]
+            i_address_start = columns["address_start"]
+            i_unit = columns.get("unit")
+            i_address_end = columns.get("address_end")
+            i_scale_factor = columns.get("scale_factor")
+            width = len(header)
+            for row in reader:
+                if len(row) < width:
+                    if not row:
+                        continue
+                    row += [""] * (width - len(row))
+                data_type = row[i_data_type].strip().upper()
+                if data_type not in NUMERIC_TYPES:
+                    continue
+                name = row[i_name]
+                metric_id = sanitise(name)
+                if not metric_id:
+                    continue
+                register = parse_int(row[i_address_start])
+                if register is None:
+                    continue
+                metric = metrics_get(metric_id)
+                if metric is not None:
+                    # Only the first row for a metric shapes it; repeats just map a register.
+                    metric["models"][model] = {"register": register}
+                    continue
+                type_name, default_words = NUMERIC_TYPES[data_type]
+                words = default_words
+                address_end = parse_int(cell(row, i_address_end))
+                if address_end is not None:
+                    end_words = address_end - register + 1
+                    if end_words > words:
+                        words = end_words
+                scale_factor = parse_float(cell(row, i_scale_factor))
+                unit_raw = cell(row, i_unit).strip()
+                engineering_unit, category = describe_unit(unit_raw)
+                metrics[metric_id] = {
                     "id": metric_id,
-                    "name": row["name"].strip(),
+                    "name": name.strip(),
                     "unit": engineering_unit or None,
                     "category": category,
                     "default": {},
-                    "models": {},
+                    "models": {model: {"register": register}},
                     "read": {
-                        "function": "input" if row["register_type"].strip() == "3X" else "holding",
+                        "function": "input" if row[i_register_type].strip() == "3X" else "holding",
                         "words": words,
                         "type": type_name,
                         "scale": scale_factor,
                     },
-                },
-            )
-            metric["models"].setdefault(model, {})["register"] = register
+                }
 
     for metric_id, overrides in FALLBACK_METRICS.items():
-        metric = metrics.setdefault(
-            metric_id,
-            {
-                "id": metric_id,
-                "name": metric_id.replace("_", " ").title(),
-                "unit": "W" if "power" in metric_id else "kWh",
-                "category": "power" if "power" in metric_id else "energy",
-                "default": {},
-                "models": {},
-                "read": {
-                    "function": "input",
-                    "words": 1 if metric_id == "meter_power" else 2,
-                    "type": "int16" if metric_id == "meter_power" else "uint32le",
-                    "scale": 1 if metric_id == "meter_power" else 0.1,
-                },
-            },
-        )
+        metric = metrics_get(metric_id)
+        if metric is None:
+            metric = copy.deepcopy(_FALLBACK_TEMPLATES[metric_id])
+            metrics[metric_id] = metric
+        models = metric["models"]
         for model, register in overrides.items():
-            metric["models"].setdefault(model, {})["register"] = register
+            models[model] = {"register": register}
 
     for metric in metrics.values():
         models = metric.get("models", {})
@@ -218,14 +276,15 @@ def build_definitions() -> dict:
 
     output = {
         "version": 1,
-        "metrics": sorted(metrics.values(), key=lambda m: m["id"]),
+        "metrics": [metrics[metric_id] for metric_id in sorted(metrics)],
     }
     return output
 
 
 def main() -> None:
     definitions = build_definitions()
-    OUTPUT_PATH.write_text(json.dumps(definitions, indent=2))
+    with OUTPUT_PATH.open("w") as handle:
+        json.dump(definitions, handle, indent=2)
     print(f"Wrote {len(definitions['metrics'])} metric definitions to {OUTPUT_PATH}")
 
 
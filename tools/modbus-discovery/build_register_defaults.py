@@ -12,9 +12,11 @@ import json
 import csv
 import re
 from dataclasses import dataclass, asdict
+from functools import lru_cache
+from operator import itemgetter
 from pathlib import Path
-from typing import Dict, Iterable, List
-from datetime import datetime
+from typing import Dict, List
+from datetime import datetime, timezone
 
 ROOT = Path(__file__).resolve().parent
 PROJECT_ROOT = ROOT.parent.parent
@@ -32,31 +34,40 @@ CSV_DEFINITIONS: List[CsvDefinition] = [
     CsvDefinition("HYBRID", ROOT / "sungrow_hybrid_v1.1.4.csv"),
 ]
 
+_KEY_TRANS = str.maketrans(
+    {**{char: " " for char in "\u2013\u2014/-().,:;"}, "%": " percent "}
+)
+_SLUG_RE = re.compile(r"[^a-z0-9]+")
+_FLOAT_RE = re.compile(r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+
 
 def sanitize_key(value: str) -> str:
-    return (
-        value.lower()
-        .replace("\u2013", "-")
-        .replace("\u2014", "-")
-        .replace("/", " ")
-        .replace("-", " ")
-        .replace("(", " ")
-        .replace(")", " ")
-        .replace(".", " ")
-        .replace(",", " ")
-        .replace(":", " ")
-        .replace(";", " ")
-        .replace("%", " percent ")
-    )
+    return value.lower().translate(_KEY_TRANS)
 
 
+@lru_cache(maxsize=4096)
 def slugify(value: str) -> str:
     sanitized = sanitize_key(value)
-    sanitized = re.sub(r"[^a-z0-9]+", "_", sanitized)
+    sanitized = _SLUG_RE.sub("_", sanitized)
     return sanitized.strip("_") or "register"
 
 
-def parse_float(value: str | None) -> float:
+def parse_int(value: str) -> int | None:
+    value = value.strip()
+    if value.isdecimal():
+        return int(value)
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+
+def parse_float(value: str) -> float:
+    value = value.strip()
+    if _FLOAT_RE.fullmatch(value):
+        return float(value)
     if not value:
         return 1.0
     try:
@@ -65,54 +76,69 @@ def parse_float(value: str | None) -> float:
         return 1.0
 
 
-def load_rows(path: Path) -> Iterable[Dict[str, str]]:
-    with path.open(newline="") as handle:
-        reader = csv.DictReader(handle)
-        for row in reader:
-            yield {key.lower(): (value or "").strip() for key, value in row.items()}
+def cell(row: List[str], index: int | None) -> str:
+    return row[index] if index is not None else ""
 
 
 def build_registers(definition: CsvDefinition) -> Dict[str, object]:
     registers = []
     source_version = ""
-    for row in load_rows(definition.path):
-        address_start = row.get("address_start")
-        if not address_start:
-            continue
-        try:
-            start = int(address_start)
-        except ValueError:
-            continue
-
-        address_end = row.get("address_end") or address_start
-        try:
-            end = int(address_end)
-        except ValueError:
-            end = start
-
-        register_type = (row.get("register_type") or "3X").upper()
-        register_kind = "holding" if register_type.startswith("4") else "input"
-
-        if not source_version:
-            source_version = row.get("source_version") or ""
-
-        registers.append(
-            {
-                "id": slugify(row.get("name", "")),
-                "no": row.get("no", ""),
-                "name": row.get("name", ""),
-                "address": start,
-                "length": max(1, end - start + 1),
-                "data_type": (row.get("data_type") or "").upper(),
-                "data_range": row.get("data_range") or None,
-                "unit": row.get("unit") or None,
-                "scale_factor": parse_float(row.get("scale_factor")),
-                "register_type": register_kind,
-                "note": row.get("note") or None,
-            }
-        )
-
-    registers.sort(key=lambda entry: (entry["address"], entry["length"]))
+    with definition.path.open(newline="") as handle:
+        reader = csv.reader(handle)
+        header = next(reader, [])
+        if not header:
+            return {"source_version": None, "registers": []}
+        columns = {name.strip().lower(): index for index, name in enumerate(header)}
+        i_address_start = columns["address_start"]
+        i_no = columns.get("no")
+        i_name = columns.get("name")
+        i_data_type = columns.get("data_type")
+        i_data_range = columns.get("data_range")
+        i_unit = columns.get("unit")
+        i_note = columns.get("note")
+        i_register_type = columns.get("register_type")
+        i_source_version = columns.get("source_version")
+        i_address_end = columns.get("address_end")
+        i_scale_factor = columns.get("scale_factor")
+        width = len(header)
+        for row in reader:
+            if len(row) < width:
+                if not row:
+                    continue
+                row += [""] * (width - len(row))
+
+            start = parse_int(row[i_address_start])
+            if start is None:
+                continue
+
+            end = parse_int(cell(row, i_address_end))
+            if end is None:
+                end = start
+
+            register_type = (cell(row, i_register_type).strip() or "3X").upper()
+            register_kind = "holding" if register_type.startswith("4") else "input"
+
+            if not source_version:
+                source_version = cell(row, i_source_version).strip()
+
+            name = cell(row, i_name).strip()
+            registers.append(
+                {
+                    "id": slugify(name),
+                    "no": cell(row, i_no).strip(),
+                    "name": name,
+                    "address": start,
+                    "length": max(1, end - start + 1),
+                    "data_type": cell(row, i_data_type).strip().upper(),
+                    "data_range": cell(row, i_data_range).strip() or None,
+                    "unit": cell(row, i_unit).strip() or None,
+                    "scale_factor": parse_float(cell(row, i_scale_factor)),
+                    "register_type": register_kind,
+                    "note": cell(row, i_note).strip() or None,
+                }
+            )
+
+    registers.sort(key=itemgetter("address", "length"))
 
     return {
         "source_version": source_version or None,
@@ -123,7 +149,7 @@ def build_registers(definition: CsvDefinition) -> Dict[str, object]:
 def build_payload() -> Dict[str, object]:
     payload = {
         "metadata": {
-            "generated_at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+            "generated_at": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
             "source": {},
         },
         "inverter_types": {},
@@ -138,7 +164,8 @@ def build_payload() -> Dict[str, object]:
 
 def main() -> None:
     payload = build_payload()
-    OUTPUT_PATH.write_text(json.dumps(payload, indent=2))
+    with OUTPUT_PATH.open("w") as handle:
+        json.dump(payload, handle, indent=2)
     print(f"Wrote {OUTPUT_PATH.relative_to(ROOT)}")
 
 